@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -11,6 +11,25 @@ class Settings(BaseSettings):
     jwt_secret_key: str = os.getenv(
         'JWT_SECRET_KEY', 'your-jwt-secret-key-change-me')
     access_token_expire_minutes: int = 30 * 24 * 8  # 8 days
+    # Password hashing: "argon2" (argon2id) or "bcrypt". When calibration is
+    # enabled the parameters are benchmarked at startup to fit the budget.
+    password_hash_scheme: str = "argon2"
+    password_hash_calibrate: bool = True
+    password_hash_target_ms: int = 100
+    password_hash_max_memory_kib: int = 64 * 1024
+    password_bcrypt_rounds: int = 12
+    # File in a directory only the app can write, where the calibration result
+    # is shared by all workers on the host; "" (default) disables caching.
+    password_hash_calibration_file: str = ""
+    # Optional user sharding: users are spread over these databases by a hash
+    # of their id, with the email index kept on `database_url`. The list must
+    # not be reordered or resized without migrating existing users.
+    shard_database_urls: List[str] = []
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_queue_size: int = 10000
+    # Fraction of records to keep per `event`, e.g. {"http.request": 0.1}
+    log_sample_rates: Dict[str, float] = {}
     cors_origins: List[str] = [
         "http://localhost:5173", "http://localhost:3000"]
 
@@ -0,0 +1,277 @@
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Mapping, Optional
+
+from .config import settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REDACTED = "[REDACTED]"
+SENSITIVE_KEYS = ("password", "token", "secret", "authorization", "cookie")
+_SENSITIVE_VALUE = re.compile(
+    r"(?i)\b(password|token|secret|authorization)(\s*[=:]\s*)(bearer\s+)?[^\s,;&]+")
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _is_sensitive(key: str) -> bool:
+    key = key.lower()
+    return any(word in key for word in SENSITIVE_KEYS)
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the correlation id of the request being served."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RedactionFilter(logging.Filter):
+    """Mask secrets in `extra` fields and `key=value` pairs in the message.
+
+    The message is rendered here so values passed as args are covered too.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key in _extra_fields(record):
+            if _is_sensitive(key):
+                setattr(record, key, REDACTED)
+        try:
+            message = record.getMessage()
+        except Exception:
+            # Filters run at the call site and their errors are not routed to
+            # handleError; a bad format string must not fail the caller. The
+            # arg values could be secrets with no key to redact them by, so
+            # only their types are kept.
+            args = record.args if isinstance(record.args, tuple) else (record.args,)
+            arg_types = ", ".join(type(arg).__name__ for arg in args)
+            message = f"{record.msg!s} (could not format args: {arg_types})"
+        record.msg = _SENSITIVE_VALUE.sub(rf"\1\2{REDACTED}", message)
+        record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records for noisy events.
+
+    Records are matched on their `event` extra field; warnings and errors
+    are never dropped.
+    """
+
+    def __init__(self, rates: Mapping[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # RedactionFilter has already rendered the message; formatting is
+        # left to the listener thread.
+        return record
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that can write several records with one write and flush."""
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("".join(lines))
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that drains everything queued before writing it out.
+
+    Under load this turns one write and flush per record into one per batch,
+    which keeps the writer thread's share of the GIL small.
+    """
+
+    max_batch = 500
+
+    def __init__(self, log_queue: queue.Queue, handler: BatchStreamHandler):
+        super().__init__(log_queue, handler)
+
+    def enqueue_sentinel(self) -> None:
+        # Wait for room: with a full queue put_nowait would make stop() raise.
+        self.queue.put(self._sentinel)
+
+    def _monitor(self) -> None:
+        handler = self.handlers[0]
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            stop = any(record is self._sentinel for record in batch)
+            records = [record for record in batch
+                       if record is not self._sentinel and handler.filter(record)]
+            if records:
+                handler.emit_batch(records)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+
+_listener: Optional[BatchingQueueListener] = None
+
+
+def setup_logging(stream=None) -> BatchingQueueListener:
+    """Route the `app` logger through a queue drained by a background thread."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.log_sample_rates))
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(RedactionFilter())
+
+    stream_handler = BatchStreamHandler(stream or sys.stdout)
+    if settings.log_json:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.log_level)
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+
+    _listener = BatchingQueueListener(log_queue, stream_handler)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    app_logger = logging.getLogger("app")
+    for handler in list(app_logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            app_logger.removeHandler(handler)
+    app_logger.propagate = True
+    _listener = None
+
+
+class RequestIdMiddleware:
+    """Assign each request a correlation id and log its completion.
+
+    An incoming `X-Request-ID` header is reused so ids can be followed across
+    services; the id is echoed back on the response. Completed requests are
+    logged at DEBUG, so the access log is off at the default level; server
+    errors are always logged as warnings.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("app.http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            level = logging.WARNING if status_code >= 500 else logging.DEBUG
+            if self.logger.isEnabledFor(level):
+                self.logger.log(
+                    level, "%s %s %s", scope["method"], scope["path"], status_code,
+                    extra={
+                        "event": "http.request",
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                    },
+                )
+            request_id_var.reset(token)
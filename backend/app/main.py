@@ -1,9 +1,13 @@
 import os
 from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from .database import init_db
 from .users import auth_backend, fastapi_users, current_active_user, UserRead, UserCreate, UserUpdate
 from .models import User
+from .password import calibrate_password_policy
+from .log import RequestIdMiddleware, setup_logging, shutdown_logging
+from .sharding import user_shards
 from .config import settings
 
 app = FastAPI(title="FastAPI Starter with JWT Auth")
@@ -14,7 +18,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 # Include authentication routes
 app.include_router(
@@ -44,7 +50,19 @@ app.include_router(
 
 @app.on_event("startup")
 async def on_startup():
+    setup_logging()
     await init_db()
+    if user_shards is not None:
+        await user_shards.init()
+    if settings.password_hash_calibrate:
+        await run_in_threadpool(calibrate_password_policy)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if user_shards is not None:
+        await user_shards.dispose()
+    shutdown_logging()
 
 
 @app.get("/")
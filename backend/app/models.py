@@ -1,10 +1,29 @@
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import Column, String, Boolean, DateTime, Index, Integer
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from sqlalchemy.sql import func
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
+from fastapi_users_db_sqlalchemy.generics import GUID
 from .database import Base
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     __tablename__ = 'users'
+
+    # fastapi-users looks emails up with lower(email) = lower(:email), which
+    # a plain index on email can't serve; uniqueness and lookups both go
+    # through ix_users_email_lower instead.
+    email = Column(String(length=320), nullable=False)
+
+
+Index('ix_users_email_lower', func.lower(User.email), unique=True)
+
+
+class UserEmailShard(Base):
+    """Global email -> shard index, kept on the main database when sharding is on."""
+    __tablename__ = 'user_email_shards'
+
+    email = Column(String(length=320), primary_key=True)
+    user_id = Column(GUID, nullable=False)
+    shard = Column(Integer, nullable=False)
+    claimed_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,251 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Optional, Tuple
+
+import bcrypt
+from argon2 import PasswordHasher, Type, extract_parameters
+from argon2.exceptions import InvalidHashError, VerificationError
+from fastapi_users.password import PasswordHelperProtocol
+from passlib import pwd
+
+from .config import settings
+
+# Lower bounds from the OWASP password storage cheat sheet; calibration never
+# goes below these, however slow the host is.
+ARGON2_MIN_MEMORY_KIB = 19 * 1024
+ARGON2_MIN_TIME_COST = 2
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+
+_CALIBRATION_PASSWORD = b"calibration-password"
+_CALIBRATION_SAMPLES = 5
+
+
+def _bcrypt_secret(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes; newer releases raise instead
+    # of truncating, so keep the historical passlib behaviour.
+    return password.encode("utf-8")[:72]
+
+
+def _bcrypt_rounds(hashed_password: str) -> int:
+    return int(hashed_password.split("$")[2])
+
+
+def _time_ms(func, *args) -> float:
+    # Median of several runs, so one noisy sample doesn't move the result.
+    samples = []
+    for _ in range(_CALIBRATION_SAMPLES):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+class PasswordHashingPolicy(PasswordHelperProtocol):
+    """Hashes with the preferred scheme and verifies argon2id and bcrypt.
+
+    `verify_and_update` never computes a replacement hash itself; callers
+    check `needs_rehash` and do that work outside the request.
+    """
+
+    def __init__(
+        self,
+        scheme: str = "argon2",
+        memory_kib: int = ARGON2_MIN_MEMORY_KIB,
+        time_cost: int = ARGON2_MIN_TIME_COST,
+        parallelism: int = 1,
+        bcrypt_rounds: int = 12,
+    ) -> None:
+        if scheme not in ("argon2", "bcrypt"):
+            raise ValueError(f"Unsupported password hash scheme: {scheme}")
+        self.scheme = scheme
+        self.bcrypt_rounds = bcrypt_rounds
+        self.argon2 = PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_kib,
+            parallelism=parallelism,
+            type=Type.ID,
+        )
+
+    def hash(self, password: str) -> str:
+        if self.scheme == "argon2":
+            return self.argon2.hash(password)
+        salt = bcrypt.gensalt(rounds=self.bcrypt_rounds)
+        return bcrypt.hashpw(_bcrypt_secret(password), salt).decode("ascii")
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        if hashed_password.startswith("$argon2"):
+            try:
+                return self.argon2.verify(hashed_password, plain_password)
+            except (VerificationError, InvalidHashError):
+                return False
+        if hashed_password.startswith("$2"):
+            try:
+                return bcrypt.checkpw(
+                    _bcrypt_secret(plain_password), hashed_password.encode("ascii"))
+            except ValueError:
+                return False
+        return False
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether the hash uses another scheme or weaker parameters.
+
+        Stronger hashes are kept, so processes whose calibration came out
+        slightly differently don't rewrite each other's hashes.
+        """
+        if self.scheme == "argon2":
+            if not hashed_password.startswith("$argon2id$"):
+                return True
+            params = extract_parameters(hashed_password)
+            return (params.memory_cost < self.argon2.memory_cost
+                    or params.time_cost < self.argon2.time_cost)
+        if not hashed_password.startswith("$2"):
+            return True
+        return _bcrypt_rounds(hashed_password) < self.bcrypt_rounds
+
+    def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return self.verify(plain_password, hashed_password), None
+
+    def generate(self) -> str:
+        return pwd.genword()
+
+    def describe(self) -> str:
+        if self.scheme == "argon2":
+            params = self.argon2
+            return (
+                f"argon2id m={params.memory_cost}KiB t={params.time_cost} "
+                f"p={params.parallelism}")
+        return f"bcrypt rounds={self.bcrypt_rounds}"
+
+    @classmethod
+    def calibrate(
+        cls,
+        scheme: str = "argon2",
+        target_ms: float = 100,
+        max_memory_kib: int = 64 * 1024,
+        parallelism: int = 1,
+    ) -> "PasswordHashingPolicy":
+        """Benchmark this host and return the strongest policy within budget.
+
+        For argon2id the memory budget is spent first and the time cost is
+        raised until a hash would exceed `target_ms`; if the minimum time cost
+        is already too slow, memory is halved down to the OWASP floor.
+        For bcrypt the cost factor is raised one step (2x work) at a time.
+        """
+        if scheme == "bcrypt":
+            rounds = BCRYPT_MIN_ROUNDS
+            elapsed = _time_ms(
+                bcrypt.hashpw, _CALIBRATION_PASSWORD, bcrypt.gensalt(rounds))
+            while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+                rounds += 1
+                elapsed *= 2
+            return cls(scheme="bcrypt", bcrypt_rounds=rounds)
+
+        def measure(memory_kib: int, time_cost: int) -> float:
+            hasher = PasswordHasher(
+                time_cost=time_cost, memory_cost=memory_kib,
+                parallelism=parallelism, type=Type.ID)
+            return _time_ms(hasher.hash, _CALIBRATION_PASSWORD)
+
+        memory_kib = max(max_memory_kib, ARGON2_MIN_MEMORY_KIB)
+        while (memory_kib > ARGON2_MIN_MEMORY_KIB
+               and measure(memory_kib, ARGON2_MIN_TIME_COST) > target_ms):
+            memory_kib = max(memory_kib // 2, ARGON2_MIN_MEMORY_KIB)
+
+        # Argon2 cost is linear in time_cost, so extrapolate from one sample.
+        per_pass = measure(memory_kib, 1)
+        time_cost = max(ARGON2_MIN_TIME_COST, int(target_ms // max(per_pass, 1e-3)))
+        return cls(
+            scheme="argon2",
+            memory_kib=memory_kib,
+            time_cost=time_cost,
+            parallelism=parallelism,
+        )
+
+
+password_policy = PasswordHashingPolicy(
+    scheme=settings.password_hash_scheme,
+    bcrypt_rounds=settings.password_bcrypt_rounds,
+)
+
+
+def get_password_policy() -> PasswordHashingPolicy:
+    return password_policy
+
+
+def _load_calibration(path: str, key: dict) -> Optional[PasswordHashingPolicy]:
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # The file is only a cache: anything unexpected, including parameters
+    # below the minimums, means calibrating again.
+    try:
+        if cached.get("key") != key:
+            return None
+        params = cached["params"]
+        numbers = [params[name] for name in
+                   ("memory_kib", "time_cost", "parallelism", "bcrypt_rounds")]
+        if any(type(value) is not int for value in numbers):
+            return None
+        memory_kib, time_cost, parallelism, bcrypt_rounds = numbers
+        if (params["scheme"] != key["scheme"]
+                or memory_kib < ARGON2_MIN_MEMORY_KIB
+                or time_cost < ARGON2_MIN_TIME_COST
+                or parallelism < 1
+                or not BCRYPT_MIN_ROUNDS <= bcrypt_rounds <= BCRYPT_MAX_ROUNDS):
+            return None
+        return PasswordHashingPolicy(
+            scheme=params["scheme"], memory_kib=memory_kib, time_cost=time_cost,
+            parallelism=parallelism, bcrypt_rounds=bcrypt_rounds)
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None
+
+
+def _save_calibration(path: str, key: dict, policy: PasswordHashingPolicy) -> None:
+    params = {"scheme": policy.scheme, "bcrypt_rounds": policy.bcrypt_rounds,
+              "memory_kib": policy.argon2.memory_cost,
+              "time_cost": policy.argon2.time_cost,
+              "parallelism": policy.argon2.parallelism}
+    # Write to a temporary file and rename so other workers never read a
+    # partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "w") as f:
+        json.dump({"key": key, "params": params}, f)
+    os.replace(tmp_path, path)
+
+
+def calibrate_password_policy() -> PasswordHashingPolicy:
+    """Replace the module policy with one tuned for this host.
+
+    The result is cached in `password_hash_calibration_file`, so every worker
+    and restart on the host uses the same parameters until the settings
+    change or the file is removed.
+    """
+    global password_policy
+    path = settings.password_hash_calibration_file
+    key = {
+        "scheme": settings.password_hash_scheme,
+        "target_ms": settings.password_hash_target_ms,
+        "max_memory_kib": settings.password_hash_max_memory_kib,
+    }
+    policy = _load_calibration(path, key) if path else None
+    if policy is None:
+        policy = PasswordHashingPolicy.calibrate(
+            scheme=key["scheme"],
+            target_ms=key["target_ms"],
+            max_memory_kib=key["max_memory_kib"],
+        )
+        if path:
+            try:
+                _save_calibration(path, key, policy)
+            except OSError:
+                pass
+    password_policy = policy
+    return password_policy
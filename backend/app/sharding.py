@@ -0,0 +1,200 @@
+import hashlib
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi_users.db import BaseUserDatabase
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from .config import settings
+from .models import User, UserEmailShard
+from .user_db import UserDatabase
+
+# An email claim this old whose user never reached its shard was left by a
+# registration that died between the two commits, and may be taken over.
+STALE_CLAIM_AGE = timedelta(minutes=5)
+
+
+def shard_for(user_id: uuid.UUID, shard_count: int) -> int:
+    """Map a user id to a shard; stable across processes and restarts."""
+    digest = hashlib.blake2b(user_id.bytes, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+class ShardedUserDatabase(BaseUserDatabase[User, uuid.UUID]):
+    """User adapter that routes each user to its shard.
+
+    Lookups by id go straight to the shard; lookups by email go through the
+    `user_email_shards` index first. Each shard is accessed through a regular
+    `UserDatabase`, with sessions opened only for shards touched
+    during the request.
+    """
+
+    def __init__(self, shards: "UserShards", index_session: AsyncSession):
+        self.shards = shards
+        self.index_session = index_session
+        self._shard_dbs: Dict[int, UserDatabase] = {}
+
+    def _shard_db(self, user_id: uuid.UUID) -> UserDatabase:
+        shard = shard_for(user_id, len(self.shards.session_makers))
+        if shard not in self._shard_dbs:
+            session = self.shards.session_makers[shard]()
+            self._shard_dbs[shard] = UserDatabase(session, User)
+        return self._shard_dbs[shard]
+
+    async def close(self) -> None:
+        for user_db in self._shard_dbs.values():
+            await user_db.session.close()
+        self._shard_dbs.clear()
+
+    async def get(self, id: uuid.UUID) -> Optional[User]:
+        return await self._shard_db(id).get(id)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        user_id = await self.index_session.scalar(
+            select(UserEmailShard.user_id).where(UserEmailShard.email == email.lower())
+        )
+        if user_id is None:
+            return None
+        return await self.get(user_id)
+
+    async def create(self, create_dict: Dict[str, Any]) -> User:
+        create_dict = {**create_dict}
+        user_id = create_dict.setdefault("id", uuid.uuid4())
+        email = create_dict["email"].lower()
+        # Claim the email globally first so two shards can't both accept it.
+        await self._claim_email(email, user_id)
+        shard_db = self._shard_db(user_id)
+        try:
+            return await shard_db.create(create_dict)
+        except Exception:
+            await shard_db.session.rollback()
+            await self._delete_index(email)
+            raise
+
+    async def _claim_email(self, email: str, user_id: uuid.UUID) -> None:
+        for attempt in range(2):
+            self.index_session.add(UserEmailShard(
+                email=email,
+                user_id=user_id,
+                shard=shard_for(user_id, len(self.shards.session_makers)),
+                claimed_at=datetime.now(timezone.utc),
+            ))
+            try:
+                await self.index_session.commit()
+                return
+            except IntegrityError:
+                await self.index_session.rollback()
+                if attempt or not await self._release_stale_claim(email):
+                    raise
+            except Exception:
+                await self.index_session.rollback()
+                raise
+
+    async def _release_stale_claim(self, email: str) -> bool:
+        """Drop an old claim on `email` whose user is missing from its shard."""
+        claim = (await self.index_session.execute(
+            select(UserEmailShard.user_id, UserEmailShard.claimed_at)
+            .where(UserEmailShard.email == email)
+        )).first()
+        if claim is None:
+            return True
+        claimed_at = claim.claimed_at
+        if claimed_at.tzinfo is None:
+            claimed_at = claimed_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - claimed_at < STALE_CLAIM_AGE:
+            return False
+        if await self.get(claim.user_id) is not None:
+            return False
+        # Match on user_id too, so a claim retaken by someone else survives.
+        await self._commit_index(
+            delete(UserEmailShard)
+            .where(UserEmailShard.email == email)
+            .where(UserEmailShard.user_id == claim.user_id)
+        )
+        return True
+
+    async def replace_hashed_password(
+        self, user: User, old_hash: str, new_hash: str
+    ) -> bool:
+        return await self._shard_db(user.id).replace_hashed_password(
+            user, old_hash, new_hash)
+
+    async def update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        old_email = user.email.lower()
+        new_email = update_dict.get("email")
+        new_email = new_email.lower() if new_email is not None else old_email
+        if new_email != old_email:
+            await self._move_index(old_email, new_email)
+        shard_db = self._shard_db(user.id)
+        try:
+            return await shard_db.update(user, update_dict)
+        except Exception:
+            await shard_db.session.rollback()
+            if new_email != old_email:
+                await self._move_index(new_email, old_email)
+            raise
+
+    async def delete(self, user: User) -> None:
+        await self._shard_db(user.id).delete(user)
+        await self._delete_index(user.email.lower())
+
+    async def _move_index(self, old_email: str, new_email: str) -> None:
+        await self._commit_index(
+            update(UserEmailShard)
+            .where(UserEmailShard.email == old_email)
+            .values(email=new_email)
+        )
+
+    async def _delete_index(self, email: str) -> None:
+        await self._commit_index(
+            delete(UserEmailShard).where(UserEmailShard.email == email))
+
+    async def _commit_index(self, statement) -> None:
+        try:
+            await self.index_session.execute(statement)
+            await self.index_session.commit()
+        except Exception:
+            await self.index_session.rollback()
+            raise
+
+
+class UserShards:
+    """Engines and session factories for the configured user shards."""
+
+    def __init__(self, shard_urls: List[str]):
+        if not shard_urls:
+            raise ValueError("At least one shard database URL is required")
+        self.engines = [create_async_engine(url, future=True) for url in shard_urls]
+        self.session_makers = [
+            sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in self.engines
+        ]
+
+    async def init(self) -> None:
+        """Create the users table on every shard."""
+        for engine in self.engines:
+            async with engine.begin() as conn:
+                await conn.run_sync(User.__table__.create, checkfirst=True)
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+    @asynccontextmanager
+    async def user_db(self, index_session: AsyncSession) -> AsyncIterator[ShardedUserDatabase]:
+        """Yield an adapter using `index_session` for the email index."""
+        user_db = ShardedUserDatabase(self, index_session)
+        try:
+            yield user_db
+        finally:
+            await user_db.close()
+
+
+user_shards: Optional[UserShards] = (
+    UserShards(settings.shard_database_urls) if settings.shard_database_urls else None
+)
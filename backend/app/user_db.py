@@ -0,0 +1,28 @@
+import uuid
+
+from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import update
+
+from .models import User
+
+
+class UserDatabase(SQLAlchemyUserDatabase[User, uuid.UUID]):
+    async def replace_hashed_password(
+        self, user: User, old_hash: str, new_hash: str
+    ) -> bool:
+        """Swap the password hash only if it is still `old_hash`.
+
+        Returns False if the password was changed in the meantime, in which
+        case the newer hash is kept.
+        """
+        try:
+            result = await self.session.execute(
+                update(User)
+                .where(User.id == user.id, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+        return result.rowcount == 1
@@ -1,19 +1,28 @@
+import asyncio
+import logging
 import uuid
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
     JWTStrategy,
 )
-from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.db import BaseUserDatabase
 from fastapi_users import schemas
 
 from .database import AsyncSessionLocal
 from .models import User
 from .config import settings
+from .password import PasswordHashingPolicy, get_password_policy
+from .sharding import user_shards
+from .user_db import UserDatabase
+
+logger = logging.getLogger(__name__)
 
 
 class UserRead(schemas.BaseUser[uuid.UUID]):
@@ -35,31 +44,84 @@ async def get_async_session():
 
 
 async def get_user_db(session=Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User)
+    if user_shards is None:
+        yield UserDatabase(session, User)
+        return
+    # With sharding on, the request session serves the email index.
+    async with user_shards.user_db(session) as user_db:
+        yield user_db
 
 
 # User manager
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = settings.secret_key
     verification_token_secret = settings.secret_key
+    password_helper: PasswordHashingPolicy
+
+    def __init__(self, user_db, password_helper: PasswordHashingPolicy):
+        super().__init__(user_db, password_helper)
+        self._pending_rehashes: List[asyncio.Task] = []
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        # Same flow as BaseUserManager.authenticate, but hashing runs in the
+        # threadpool and upgrading a stale hash doesn't delay the response.
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher to mitigate timing attack
+            await run_in_threadpool(self.password_helper.hash, credentials.password)
+            return None
+
+        verified = await run_in_threadpool(
+            self.password_helper.verify, credentials.password, user.hashed_password)
+        if not verified:
+            return None
+        if self.password_helper.needs_rehash(user.hashed_password):
+            self._pending_rehashes.append(
+                asyncio.create_task(
+                    self._rehash(user, user.hashed_password, credentials.password)))
+        return user
+
+    async def _rehash(self, user: User, old_hash: str, password: str) -> None:
+        new_hash = await run_in_threadpool(self.password_helper.hash, password)
+        # The password may have been reset while hashing; keep the newer hash.
+        if not await self.user_db.replace_hashed_password(user, old_hash, new_hash):
+            logger.debug("Skipped password rehash: hash changed",
+                         extra={"user_id": str(user.id)})
+
+    async def wait_for_rehashes(self) -> None:
+        results = await asyncio.gather(*self._pending_rehashes, return_exceptions=True)
+        self._pending_rehashes.clear()
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Password rehash failed", exc_info=result)
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
-        print(f"User {user.id} has registered.")
+        logger.info("User registered", extra={
+                    "event": "user.registered", "user_id": str(user.id)})
 
     async def on_after_forgot_password(
         self, user: User, token: str, request: Optional[Request] = None
     ):
-        print(f"User {user.id} has forgot their password. Reset token: {token}")
+        # The token is a credential; it must reach the user by email, never the logs.
+        logger.info("Password reset requested", extra={
+                    "event": "user.forgot_password", "user_id": str(user.id)})
 
     async def on_after_request_verify(
         self, user: User, token: str, request: Optional[Request] = None
     ):
-        print(
-            f"Verification requested for user {user.id}. Verification token: {token}")
+        logger.info("Verification requested", extra={
+                    "event": "user.request_verify", "user_id": str(user.id)})
 
 
-async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+async def get_user_manager(user_db: BaseUserDatabase = Depends(get_user_db)):
+    user_manager = UserManager(user_db, get_password_policy())
+    yield user_manager
+    # Rehashes scheduled during login still need the session; let them finish
+    # before it is closed.
+    await user_manager.wait_for_rehashes()
 
 
 # JWT authentication setup
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark email lookup and login latency on a large users table.
+
+Loads --users rows into a SQLite file, then times the case-insensitive
+`get_by_email` lookup and full /auth/jwt/login requests, first without the
+lower(email) index (what the default unique index on email gives) and then
+with ix_users_email_lower. Pass --url (e.g. postgresql+asyncpg://...) to
+run against another database. The benchmark creates and afterwards drops the
+app's tables there, so it refuses to run if any of them already exist; point
+it at an empty scratch database, never the app's own.
+
+Usage (from backend/):
+    python -m benchmarks.email_lookup_latency [--users 1000000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from fastapi_users.db import SQLAlchemyUserDatabase
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine, insert, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import password
+from app.database import Base
+from app.main import app
+from app.models import User
+from app.password import PasswordHashingPolicy
+from app.users import get_async_session
+
+BATCH = 50000
+
+
+def load(sync_url: str, users: int, hashed_password: str) -> None:
+    engine = create_engine(sync_url)
+    existing = [name for name in Base.metadata.tables if inspect(engine).has_table(name)]
+    if existing:
+        engine.dispose()
+        raise SystemExit(
+            f"Refusing to run: {', '.join(existing)} already exist in the target "
+            "database. Use an empty scratch database.")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Start from the previous schema: a plain unique index on email.
+        conn.execute(text("DROP INDEX ix_users_email_lower"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+        for start in range(0, users, BATCH):
+            conn.execute(insert(User), [
+                {"id": uuid.uuid4(), "email": f"user{i}@example.com",
+                 "hashed_password": hashed_password, "is_active": True,
+                 "is_superuser": False, "is_verified": False}
+                for i in range(start, min(start + BATCH, users))
+            ])
+        conn.execute(text("ANALYZE users"))
+    engine.dispose()
+
+
+def create_email_index(sync_url: str) -> float:
+    engine = create_engine(sync_url)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_users_email"))
+        next(iter(User.__table__.indexes)).create(conn)
+        conn.execute(text("ANALYZE users"))
+    engine.dispose()
+    return time.perf_counter() - start
+
+
+async def measure(url: str, users: int, lookups: int, logins: int):
+    engine = create_async_engine(url)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_bench_session():
+        async with session_maker() as session:
+            yield session
+
+    lookup_ms = []
+    async with session_maker() as session:
+        user_db = SQLAlchemyUserDatabase(session, User)
+        for _ in range(lookups):
+            email = f"USER{random.randrange(users)}@Example.com"
+            start = time.perf_counter()
+            assert await user_db.get_by_email(email) is not None
+            lookup_ms.append((time.perf_counter() - start) * 1000)
+
+    login_ms = []
+    app.dependency_overrides[get_async_session] = get_bench_session
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            for _ in range(logins):
+                credentials = {"username": f"user{random.randrange(users)}@example.com",
+                               "password": "benchpassword123"}
+                start = time.perf_counter()
+                response = await client.post("/auth/jwt/login", data=credentials)
+                login_ms.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+    return statistics.median(lookup_ms), statistics.median(login_ms)
+
+
+async def main(args):
+    policy = PasswordHashingPolicy()
+    password.password_policy = policy
+    hashed_password = policy.hash("benchpassword123")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite+aiosqlite:///{tmp}/users.db"
+        sync_url = url.replace("+aiosqlite", "").replace("+asyncpg", "+psycopg2")
+
+        start = time.perf_counter()
+        load(sync_url, args.users, hashed_password)
+        print(f"loaded {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'index':<22} {'lookup p50 ms':>14} {'login p50 ms':>13}")
+        lookup, login = await measure(url, args.users, args.scan_lookups, args.scan_lookups)
+        print(f"{'unique(email) only':<22} {lookup:>14.2f} {login:>13.2f}")
+
+        print(f"built ix_users_email_lower in {create_email_index(sync_url):.1f}s")
+        lookup, login = await measure(url, args.users, args.lookups, args.logins)
+        print(f"{'lower(email)':<22} {lookup:>14.2f} {login:>13.2f}")
+
+        if args.url:
+            engine = create_engine(sync_url)
+            Base.metadata.drop_all(engine)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--scan-lookups", type=int, default=10,
+                        help="lookups and logins to time without the index")
+    parser.add_argument("--url")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark the logging pipeline: records/s and latency added to requests.
+
+Compares the queue-based pipeline in app.log against a synchronous
+StreamHandler (what print() amounted to) and against logging turned off.
+Requests are timed with the default settings, where the per-request access
+log is off, and with it enabled ("+access", LOG_LEVEL=DEBUG). Output goes to
+a real file; --sink-latency-ms adds a delay to every write to model stdout
+backed by a slow pipe or log collector.
+
+Usage (from backend/):
+    python -m benchmarks.logging_throughput [--records 50000] [--requests 2000]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from app import log
+from app.config import settings
+from app.main import app
+
+
+class SlowStream:
+    def __init__(self, stream, latency_ms: float):
+        self.stream = stream
+        self.latency = latency_ms / 1000
+
+    def write(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def sync_handler(stream) -> logging.Handler:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(log.JsonFormatter())
+    for log_filter in (log.RequestContextFilter(), log.RedactionFilter()):
+        handler.addFilter(log_filter)
+    return handler
+
+
+class Mode:
+    """Configure the `app` logger for one benchmark run."""
+
+    sink_latency_ms = 0.0
+
+    def __init__(self, name: str):
+        self.name, _, access = name.partition("+")
+        self.level = "DEBUG" if access else settings.log_level
+
+    def __enter__(self):
+        self.file = tempfile.TemporaryFile("w+")
+        self.stream = SlowStream(self.file, self.sink_latency_ms)
+        app_logger = logging.getLogger("app")
+        if self.name == "queue":
+            self.default_level = settings.log_level
+            settings.log_level = self.level
+            log.setup_logging(self.stream)
+        elif self.name == "sync":
+            self.handler = sync_handler(self.stream)
+            app_logger.addHandler(self.handler)
+            app_logger.setLevel(self.level)
+            app_logger.propagate = False
+        else:
+            app_logger.setLevel(logging.WARNING)
+            app_logger.propagate = False
+        return self
+
+    def __exit__(self, *exc):
+        app_logger = logging.getLogger("app")
+        if self.name == "queue":
+            log.shutdown_logging()
+            settings.log_level = self.default_level
+        elif self.name == "sync":
+            app_logger.removeHandler(self.handler)
+        app_logger.setLevel(logging.NOTSET)
+        app_logger.propagate = True
+        self.file.close()
+
+
+def bench_records(mode: str, records: int):
+    logger = logging.getLogger("app.bench")
+    with Mode(mode):
+        start = time.perf_counter()
+        for i in range(records):
+            logger.info("User %s registered", i, extra={"event": "user.registered"})
+        caller = time.perf_counter() - start
+    # Leaving the context drains the queue, so this includes the writer thread.
+    total = time.perf_counter() - start
+    return records / caller, records / total
+
+
+async def bench_requests(mode: str, requests: int, concurrency: int):
+    latencies = []
+
+    async def worker(client, count):
+        for _ in range(count):
+            start = time.perf_counter()
+            await client.get("/")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with Mode(mode):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                worker(client, requests // concurrency) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return len(latencies) / elapsed, statistics.median(latencies), p99
+
+
+async def main(records: int, requests: int, concurrency: int):
+    print(f"{'mode':<6} {'records/s (caller)':>19} {'records/s (drained)':>20}")
+    for mode in ("queue", "sync"):
+        caller, drained = bench_records(mode, records)
+        print(f"{mode:<6} {caller:>19.0f} {drained:>20.0f}")
+
+    print(f"\nGET / x{requests}, concurrency {concurrency}")
+    print(f"{'mode':<13} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in ("off", "queue", "queue+access", "sync+access"):
+        rate, p50, p99 = await bench_requests(mode, requests, concurrency)
+        print(f"{mode:<13} {rate:>8.0f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sink-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    Mode.sink_latency_ms = args.sink_latency_ms
+    asyncio.run(main(args.records, args.requests, args.concurrency))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark /auth/jwt/login throughput per core for each password hash policy.
+
+Requests are sent one at a time, so only one hash is computed at once and
+the result approximates what a single core can sustain.
+
+Usage (from backend/):
+    python -m benchmarks.login_throughput [--logins 50]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import password
+from app.config import settings
+from app.database import Base
+from app.main import app
+from app.password import PasswordHashingPolicy
+from app.users import get_async_session
+
+
+def policies():
+    yield "bcrypt rounds=12 (legacy default)", PasswordHashingPolicy(
+        scheme="bcrypt", bcrypt_rounds=12)
+    yield "argon2id OWASP minimum", PasswordHashingPolicy(scheme="argon2")
+    for scheme in ("bcrypt", "argon2"):
+        policy = PasswordHashingPolicy.calibrate(
+            scheme=scheme,
+            target_ms=settings.password_hash_target_ms,
+            max_memory_kib=settings.password_hash_max_memory_kib,
+        )
+        yield f"calibrated {policy.describe()}", policy
+
+
+async def measure(policy: PasswordHashingPolicy, logins: int) -> float:
+    db_file = tempfile.mktemp(suffix=".db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+    session_local = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_bench_session():
+        async with session_local() as session:
+            yield session
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    app.dependency_overrides[get_async_session] = get_bench_session
+    password.password_policy = policy
+
+    credentials = {"username": "bench@example.com", "password": "benchpassword123"}
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            await client.post("/auth/register", json={
+                "email": credentials["username"],
+                "password": credentials["password"],
+            })
+            start = time.perf_counter()
+            for _ in range(logins):
+                response = await client.post("/auth/jwt/login", data=credentials)
+                assert response.status_code == 200, response.text
+            elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+        os.remove(db_file)
+    return logins / elapsed
+
+
+async def main(logins: int):
+    print(f"{'policy':<45} {'logins/s/core':>14} {'ms/login':>9}")
+    for name, policy in policies():
+        rate = await measure(policy, logins)
+        print(f"{name:<45} {rate:>14.1f} {1000 / rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=50)
+    asyncio.run(main(parser.parse_args().logins))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark user registration throughput as the number of shards grows.
+
+Each registration goes through the same user adapter the app uses, with a
+fresh session per registration as in a request. Passwords are hashed once
+up front: hashing costs the same with or without sharding, and it would hide
+the database writes being measured. Shards are SQLite files by default; pass
+--url-template with a `{i}` placeholder to benchmark real databases.
+
+Usage (from backend/):
+    python -m benchmarks.sharding_throughput [--users 2000] [--shards 1 2 4 8]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import User
+from app.password import PasswordHashingPolicy
+from app.sharding import UserShards
+
+
+def use_wal(engine) -> None:
+    # SQLite's default rollback journal lets one reader-turned-writer deadlock
+    # another under concurrency; WAL is how SQLite would be run for this.
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+
+
+async def run(create, users: int, concurrency: int, hashed_password: str) -> float:
+    counter = iter(range(users))
+
+    async def worker():
+        for i in counter:
+            await create({"email": f"user{i}@example.com", "hashed_password": hashed_password})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return users / (time.perf_counter() - start)
+
+
+async def bench(url_template: str, shard_count: int, users: int, concurrency: int,
+                hashed_password: str) -> float:
+    index_engine = create_async_engine(url_template.format(i="index"))
+    use_wal(index_engine)
+    index_session_maker = sessionmaker(
+        index_engine, class_=AsyncSession, expire_on_commit=False)
+    async with index_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    if shard_count == 0:
+        async def create(create_dict):
+            async with index_session_maker() as session:
+                await SQLAlchemyUserDatabase(session, User).create(create_dict)
+        shards = None
+    else:
+        shards = UserShards([url_template.format(i=i) for i in range(shard_count)])
+        for engine in shards.engines:
+            use_wal(engine)
+        await shards.init()
+
+        async def create(create_dict):
+            async with index_session_maker() as session:
+                async with shards.user_db(session) as user_db:
+                    await user_db.create(create_dict)
+
+    try:
+        return await run(create, users, concurrency, hashed_password)
+    finally:
+        if shards is not None:
+            await shards.dispose()
+        await index_engine.dispose()
+
+
+async def main(args):
+    hashed_password = PasswordHashingPolicy().hash("benchpassword123")
+    print(f"{'shards':<10} {'registrations/s':>16}")
+    for shard_count in [0] + args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            template = args.url_template or f"sqlite+aiosqlite:///{tmp}/{{i}}.db"
+            rate = await bench(template, shard_count, args.users, args.concurrency,
+                               hashed_password)
+        label = "unsharded" if shard_count == 0 else str(shard_count)
+        print(f"{label:<10} {rate:>16.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--url-template")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+import io
+import json
+import logging
+
+from httpx import AsyncClient
+
+from app import log
+from app.log import (
+    REDACTED,
+    JsonFormatter,
+    RedactionFilter,
+    RequestContextFilter,
+    SamplingFilter,
+    request_id_var,
+)
+
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogFilters:
+    """Test logging filters and formatter."""
+
+    def test_redacts_sensitive_extra_fields(self):
+        """Test secret-looking extra fields are masked."""
+        record = make_record("Password reset requested",
+                             token="abc123", user_id="42")
+        RedactionFilter().filter(record)
+
+        assert record.token == REDACTED
+        assert record.user_id == "42"
+
+    def test_redacts_secrets_in_message(self):
+        """Test key=value secrets are masked after args are rendered."""
+        record = make_record("Reset token: %s sent, password=%s", "abc123", "hunter2")
+        RedactionFilter().filter(record)
+
+        message = record.getMessage()
+        assert "abc123" not in message
+        assert "hunter2" not in message
+        assert message == f"Reset token: {REDACTED} sent, password={REDACTED}"
+
+    def test_redaction_never_raises_on_bad_args(self):
+        """Test a mismatched format string is logged instead of raising."""
+        record = make_record("%d items, token=%s", "oops", "abc123")
+        assert RedactionFilter().filter(record)
+
+        message = record.getMessage()
+        assert message.startswith("%d items")
+        assert "abc123" not in message
+
+    def test_sampling_drops_noisy_events(self):
+        """Test events sampled at 0 are dropped but warnings are kept."""
+        sampler = SamplingFilter({"http.request": 0.0})
+
+        assert not sampler.filter(make_record("GET /", event="http.request"))
+        assert sampler.filter(make_record("GET /", event="user.registered"))
+        assert sampler.filter(
+            make_record("GET /", level=logging.WARNING, event="http.request"))
+
+    def test_json_formatter_includes_request_id(self):
+        """Test JSON output carries the correlation id and extra fields."""
+        token = request_id_var.set("req-1")
+        try:
+            record = make_record("User registered", event="user.registered")
+            RequestContextFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+
+        payload = json.loads(JsonFormatter().format(record))
+        assert payload["message"] == "User registered"
+        assert payload["level"] == "INFO"
+        assert payload["request_id"] == "req-1"
+        assert payload["event"] == "user.registered"
+
+
+class TestLoggingPipeline:
+    """Test the queue-based pipeline and request middleware."""
+
+    def test_queue_listener_writes_json(self):
+        """Test records reach the stream via the background listener."""
+        stream = io.StringIO()
+        log.setup_logging(stream)
+        try:
+            logging.getLogger("app.test").info(
+                "Verification token: %s", "abc123", extra={"event": "test"})
+        finally:
+            log.shutdown_logging()
+
+        payload = json.loads(stream.getvalue().splitlines()[-1])
+        assert payload["message"] == f"Verification token: {REDACTED}"
+        assert payload["event"] == "test"
+
+    def test_bad_log_call_does_not_raise(self):
+        """Test formatting errors never reach the logging call site."""
+        stream = io.StringIO()
+        log.setup_logging(stream)
+        try:
+            logging.getLogger("app.test").info("%d items", "oops")
+        finally:
+            log.shutdown_logging()
+
+        assert "%d items" in json.loads(stream.getvalue().splitlines()[-1])["message"]
+
+    def test_shutdown_flushes_full_queue(self, monkeypatch):
+        """Test stopping with a full queue writes every queued record."""
+        monkeypatch.setattr(log.settings, "log_queue_size", 5)
+        stream = io.StringIO()
+        listener = log.setup_logging(stream)
+        listener.stop()
+        for i in range(10):
+            logging.getLogger("app.test").info("record %s", i)
+        listener.start()
+        log.shutdown_logging()
+
+        lines = stream.getvalue().splitlines()
+        assert [json.loads(line)["message"] for line in lines] == [
+            f"record {i}" for i in range(5)]
+
+    async def test_access_log_is_debug(self, client: AsyncClient, caplog):
+        """Test completed requests aren't logged at the default level."""
+        with caplog.at_level(logging.INFO, logger="app"):
+            await client.get("/")
+        assert not [r for r in caplog.records if getattr(r, "event", None) == "http.request"]
+
+        with caplog.at_level(logging.DEBUG, logger="app"):
+            await client.get("/")
+        records = [r for r in caplog.records if getattr(r, "event", None) == "http.request"]
+        assert [r.levelno for r in records] == [logging.DEBUG]
+
+    async def test_request_id_header(self, client: AsyncClient):
+        """Test a request id is generated, or reused when supplied."""
+        response = await client.get("/")
+        assert len(response.headers["x-request-id"]) == 32
+
+        response = await client.get("/", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+
+    async def test_forgot_password_does_not_log_token(self, client: AsyncClient, caplog):
+        """Test reset tokens never reach the logs."""
+        await client.post("/auth/register", json={
+            "email": "forgot@example.com", "password": "testpassword123"})
+
+        with caplog.at_level(logging.INFO, logger="app"):
+            response = await client.post(
+                "/auth/forgot-password", json={"email": "forgot@example.com"})
+        assert response.status_code == 202
+
+        records = [r for r in caplog.records if getattr(r, "event", None) == "user.forgot_password"]
+        assert len(records) == 1
+        assert not hasattr(records[0], "token")
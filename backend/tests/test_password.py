@@ -0,0 +1,205 @@
+import json
+from types import SimpleNamespace
+
+import bcrypt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+
+from app import password
+from app.config import settings
+from app.models import User
+from app.password import (
+    ARGON2_MIN_MEMORY_KIB,
+    ARGON2_MIN_TIME_COST,
+    BCRYPT_MIN_ROUNDS,
+    PasswordHashingPolicy,
+)
+from app.user_db import UserDatabase
+from app.users import UserManager
+
+
+class TestPasswordHashingPolicy:
+    """Test password hashing policy."""
+
+    def test_argon2_hash_and_verify(self):
+        """Test argon2id hashes verify against the right password only."""
+        policy = PasswordHashingPolicy(scheme="argon2")
+        hashed = policy.hash("testpassword123")
+
+        assert hashed.startswith("$argon2id$")
+        assert policy.verify("testpassword123", hashed)
+        assert not policy.verify("wrongpassword", hashed)
+        assert not policy.needs_rehash(hashed)
+
+    def test_bcrypt_hash_and_verify(self):
+        """Test bcrypt policy hashes with the configured cost."""
+        policy = PasswordHashingPolicy(scheme="bcrypt", bcrypt_rounds=4)
+        hashed = policy.hash("testpassword123")
+
+        assert hashed.startswith("$2b$04$")
+        assert policy.verify("testpassword123", hashed)
+        assert not policy.verify("wrongpassword", hashed)
+        assert not policy.needs_rehash(hashed)
+
+    def test_legacy_and_weaker_hashes_need_rehash(self):
+        """Test other schemes and weaker argon2id parameters are flagged."""
+        policy = PasswordHashingPolicy(
+            scheme="argon2", time_cost=ARGON2_MIN_TIME_COST + 1)
+        legacy = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(4)).decode()
+        weaker = PasswordHashingPolicy(scheme="argon2").hash("testpassword123")
+
+        assert policy.verify("testpassword123", legacy)
+        assert policy.needs_rehash(legacy)
+        assert policy.needs_rehash(weaker)
+        assert PasswordHashingPolicy(scheme="bcrypt").needs_rehash(weaker)
+
+    def test_stronger_hashes_are_kept(self):
+        """Test hashes stronger than the policy are never downgraded."""
+        argon2_policy = PasswordHashingPolicy(scheme="argon2")
+        stronger = PasswordHashingPolicy(
+            scheme="argon2", memory_kib=ARGON2_MIN_MEMORY_KIB * 2,
+            time_cost=ARGON2_MIN_TIME_COST + 1,
+        ).hash("testpassword123")
+        bcrypt_policy = PasswordHashingPolicy(scheme="bcrypt", bcrypt_rounds=4)
+        stronger_bcrypt = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(5)).decode()
+
+        assert not argon2_policy.needs_rehash(stronger)
+        assert not bcrypt_policy.needs_rehash(stronger_bcrypt)
+        assert PasswordHashingPolicy(
+            scheme="bcrypt", bcrypt_rounds=6).needs_rehash(stronger_bcrypt)
+
+    def test_verify_and_update_never_rehashes(self):
+        """Test rehashing is left to the caller."""
+        policy = PasswordHashingPolicy(scheme="argon2")
+        legacy = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(4)).decode()
+
+        assert policy.verify_and_update("testpassword123", legacy) == (True, None)
+
+    def test_verify_unknown_hash_format(self):
+        """Test unrecognised hashes are rejected rather than raising."""
+        policy = PasswordHashingPolicy()
+        assert not policy.verify("testpassword123", "not-a-hash")
+
+    def test_calibrate_respects_floors(self):
+        """Test calibration never goes below the minimum parameters."""
+        argon2_policy = PasswordHashingPolicy.calibrate(
+            scheme="argon2", target_ms=1, max_memory_kib=1024)
+        bcrypt_policy = PasswordHashingPolicy.calibrate(
+            scheme="bcrypt", target_ms=1)
+
+        assert argon2_policy.argon2.memory_cost == ARGON2_MIN_MEMORY_KIB
+        assert argon2_policy.argon2.time_cost == ARGON2_MIN_TIME_COST
+        assert bcrypt_policy.bcrypt_rounds == BCRYPT_MIN_ROUNDS
+
+    def test_calibration_is_cached(self, tmp_path, monkeypatch):
+        """Test workers reuse a cached calibration instead of re-measuring."""
+        monkeypatch.setattr(password, "password_policy", password.password_policy)
+        monkeypatch.setattr(settings, "password_hash_calibration_file",
+                            str(tmp_path / "calibration.json"))
+        monkeypatch.setattr(settings, "password_hash_target_ms", 1)
+        first = password.calibrate_password_policy()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("calibration should come from the cache")
+
+        monkeypatch.setattr(PasswordHashingPolicy, "calibrate", fail)
+        second = password.calibrate_password_policy()
+        assert second.describe() == first.describe()
+
+        monkeypatch.setattr(settings, "password_hash_target_ms", 2)
+        with pytest.raises(AssertionError):
+            password.calibrate_password_policy()
+
+    @pytest.mark.parametrize("contents", [
+        "[1, 2]",
+        '{"key": null}',
+        "KEY_ONLY",
+        "WEAK",
+        "NOT_INT",
+    ])
+    def test_invalid_calibration_cache_is_ignored(self, tmp_path, monkeypatch, contents):
+        """Test malformed or too-weak cached parameters are recalibrated."""
+        path = tmp_path / "calibration.json"
+        key = {"scheme": "argon2", "target_ms": 1, "max_memory_kib": 1024}
+        params = {"scheme": "argon2", "bcrypt_rounds": BCRYPT_MIN_ROUNDS,
+                  "memory_kib": ARGON2_MIN_MEMORY_KIB,
+                  "time_cost": ARGON2_MIN_TIME_COST, "parallelism": 1}
+        if contents == "KEY_ONLY":
+            contents = json.dumps({"key": key})
+        elif contents == "WEAK":
+            contents = json.dumps({"key": key, "params": {
+                **params, "memory_kib": 8, "time_cost": 1}})
+        elif contents == "NOT_INT":
+            contents = json.dumps({"key": key, "params": {**params, "time_cost": "2"}})
+        path.write_text(contents)
+        monkeypatch.setattr(password, "password_policy", password.password_policy)
+        monkeypatch.setattr(settings, "password_hash_calibration_file", str(path))
+        monkeypatch.setattr(settings, "password_hash_scheme", "argon2")
+        monkeypatch.setattr(settings, "password_hash_target_ms", 1)
+        monkeypatch.setattr(settings, "password_hash_max_memory_kib", 1024)
+
+        policy = password.calibrate_password_policy()
+        assert policy.argon2.memory_cost >= ARGON2_MIN_MEMORY_KIB
+        assert policy.argon2.time_cost >= ARGON2_MIN_TIME_COST
+
+
+class TestRehashOnLogin:
+    """Test legacy hashes are upgraded after a successful login."""
+
+    async def test_login_upgrades_bcrypt_hash(self, client: AsyncClient):
+        """Test a bcrypt hash is replaced with argon2id on login."""
+        from tests.test_db import TestAsyncSessionLocal
+
+        user_data = {"email": "legacy@example.com", "password": "testpassword123"}
+        await client.post("/auth/register", json=user_data)
+
+        legacy = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(4)).decode()
+        async with TestAsyncSessionLocal() as session:
+            await session.execute(
+                update(User)
+                .where(User.email == user_data["email"])
+                .values(hashed_password=legacy)
+            )
+            await session.commit()
+
+        response = await client.post(
+            "/auth/jwt/login",
+            data={"username": user_data["email"], "password": user_data["password"]},
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        assert response.status_code == 200
+
+        async with TestAsyncSessionLocal() as session:
+            hashed = await session.scalar(
+                select(User.hashed_password).where(User.email == user_data["email"])
+            )
+        assert hashed.startswith("$argon2id$")
+
+    async def test_rehash_keeps_concurrent_password_change(self, test_db):
+        """Test a rehash doesn't overwrite a hash changed after login."""
+        from tests.test_db import TestAsyncSessionLocal
+
+        policy = PasswordHashingPolicy()
+        legacy = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(4)).decode()
+        async with TestAsyncSessionLocal() as session:
+            manager = UserManager(UserDatabase(session, User), policy)
+            user = await manager.user_db.create(
+                {"email": "race@example.com", "hashed_password": legacy})
+            credentials = SimpleNamespace(
+                username="race@example.com", password="testpassword123")
+            assert (await manager.authenticate(credentials)).id == user.id
+            await session.commit()
+
+            # A password reset lands before the scheduled rehash runs.
+            reset = policy.hash("newpassword456")
+            async with TestAsyncSessionLocal() as other:
+                await other.execute(
+                    update(User).where(User.id == user.id).values(hashed_password=reset))
+                await other.commit()
+            await manager.wait_for_rehashes()
+
+        async with TestAsyncSessionLocal() as session:
+            hashed = await session.scalar(
+                select(User.hashed_password).where(User.id == user.id))
+        assert hashed == reset
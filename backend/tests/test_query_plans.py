@@ -0,0 +1,135 @@
+"""
+Query-plan regression tests for the hot auth lookups.
+
+The statements are captured from the real adapters and run through EXPLAIN,
+failing if any of them falls back to scanning the table. SQLite is always
+checked; set TEST_POSTGRES_URL (postgresql+asyncpg://...) to an empty scratch
+database to check Postgres too, with sequential scans disabled so a usable
+index is always chosen.
+"""
+import os
+import re
+
+import pytest
+from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import User
+from app.sharding import UserShards
+from tests.test_db import test_engine
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture(params=[
+    pytest.param(None, id="sqlite"),
+    pytest.param(POSTGRES_URL, id="postgres", marks=pytest.mark.skipif(
+        not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")),
+])
+async def engine(request, test_db):
+    if request.param is None:
+        yield test_engine
+        return
+    engine = create_async_engine(request.param)
+    async with engine.begin() as conn:
+        # The tables are dropped afterwards; never touch a database in use.
+        existing = await conn.run_sync(lambda sync_conn: [
+            name for name in Base.metadata.tables
+            if inspect(sync_conn).has_table(name)])
+        if existing:
+            await engine.dispose()
+            pytest.fail(f"TEST_POSTGRES_URL must be an empty database; found {existing}")
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user_db(engine):
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as session:
+        user_db = SQLAlchemyUserDatabase(session, User)
+        for i in range(20):
+            await user_db.create({"email": f"User{i}@example.com", "hashed_password": "x"})
+        yield user_db
+
+
+async def capture_selects(engine, operation):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await operation()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    assert statements, "operation issued no SELECT"
+    return statements
+
+
+async def assert_index_only(engine, statements):
+    postgres = engine.dialect.name == "postgresql"
+    async with engine.connect() as conn:
+        if postgres:
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            prefix = "EXPLAIN " if postgres else "EXPLAIN QUERY PLAN "
+            result = await conn.exec_driver_sql(prefix + statement, parameters)
+            plan = "\n".join(str(row[-1]) for row in result)
+            scan = "Seq Scan" in plan if postgres else re.search(r"\bSCAN\b", plan)
+            assert not scan, f"Table scan in plan for:\n{statement}\n{plan}"
+
+
+class TestAuthQueryPlans:
+    """Test the auth lookups are served by indexes."""
+
+    async def test_get_by_email_uses_index(self, engine, user_db):
+        """Test the case-insensitive login lookup uses the email index."""
+        async def lookup():
+            user = await user_db.get_by_email("USER7@EXAMPLE.COM")
+            assert user.email == "User7@example.com"
+
+        await assert_index_only(engine, await capture_selects(engine, lookup))
+
+    async def test_get_by_id_uses_primary_key(self, engine, user_db):
+        """Test the token user lookup uses the primary key."""
+        user = await user_db.get_by_email("user3@example.com")
+
+        async def lookup():
+            assert (await user_db.get(user.id)).id == user.id
+
+        await assert_index_only(engine, await capture_selects(engine, lookup))
+
+    async def test_sharded_email_index_uses_primary_key(self, engine, tmp_path):
+        """Test the email -> shard lookup is a primary-key search."""
+        shards = UserShards([f"sqlite+aiosqlite:///{tmp_path}/shard0.db"])
+        await shards.init()
+        session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_maker() as session:
+                async with shards.user_db(session) as user_db:
+                    await user_db.create(
+                        {"email": "sharded@example.com", "hashed_password": "x"})
+
+                    async def lookup():
+                        assert await user_db.get_by_email("Sharded@example.com")
+
+                    statements = await capture_selects(engine, lookup)
+        finally:
+            await shards.dispose()
+        await assert_index_only(engine, statements)
+
+    async def test_email_uniqueness_is_case_insensitive(self, engine, user_db):
+        """Test the functional index rejects case variants of an email."""
+        from sqlalchemy.exc import IntegrityError
+
+        with pytest.raises(IntegrityError):
+            await user_db.create({"email": "USER1@example.com", "hashed_password": "x"})
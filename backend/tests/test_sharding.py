@@ -0,0 +1,172 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import users
+from app.models import User, UserEmailShard
+from app.sharding import UserShards, shard_for
+
+
+@pytest.fixture
+async def user_shards(tmp_path, monkeypatch):
+    """Three SQLite shards wired into get_user_db."""
+    shards = UserShards(
+        [f"sqlite+aiosqlite:///{tmp_path}/shard{i}.db" for i in range(3)])
+    await shards.init()
+    monkeypatch.setattr(users, "user_shards", shards)
+    yield shards
+    await shards.dispose()
+
+
+async def count_users(shards: UserShards):
+    counts = []
+    for session_maker in shards.session_makers:
+        async with session_maker() as session:
+            counts.append(await session.scalar(select(func.count()).select_from(User)))
+    return counts
+
+
+class TestShardFor:
+    """Test shard routing."""
+
+    def test_shard_for_is_stable_and_in_range(self):
+        """Test the same id always maps to the same shard."""
+        user_id = uuid.UUID("8c4e1f8e-0a8f-4e0b-9b3a-2f9c1d2b7e11")
+        assert shard_for(user_id, 4) == shard_for(uuid.UUID(str(user_id)), 4)
+        assert all(0 <= shard_for(uuid.uuid4(), 4) < 4 for _ in range(100))
+
+    def test_shard_for_spreads_users(self):
+        """Test random ids use every shard."""
+        assert {shard_for(uuid.uuid4(), 4) for _ in range(200)} == {0, 1, 2, 3}
+
+
+class TestShardedUsers:
+    """Test auth flows with sharded user storage."""
+
+    async def test_register_and_login(self, client: AsyncClient, user_shards):
+        """Test users spread over shards and can log in by email."""
+        for i in range(12):
+            response = await client.post("/auth/register", json={
+                "email": f"user{i}@example.com", "password": "testpassword123"})
+            assert response.status_code == 201
+            user_id = uuid.UUID(response.json()["id"])
+
+        counts = await count_users(user_shards)
+        assert sum(counts) == 12
+        assert len([c for c in counts if c]) > 1
+
+        response = await client.post(
+            "/auth/jwt/login",
+            data={"username": "USER11@example.com", "password": "testpassword123"},
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        assert response.status_code == 200
+
+        token = response.json()["access_token"]
+        response = await client.get(
+            "/users/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert uuid.UUID(response.json()["id"]) == user_id
+
+    async def test_duplicate_email_rejected(self, client: AsyncClient, user_shards):
+        """Test the email index rejects an address already on another shard."""
+        user_data = {"email": "dup@example.com", "password": "testpassword123"}
+        assert (await client.post("/auth/register", json=user_data)).status_code == 201
+
+        user_data["email"] = "Dup@Example.com"
+        assert (await client.post("/auth/register", json=user_data)).status_code == 400
+        assert sum(await count_users(user_shards)) == 1
+
+    async def test_update_and_delete_keep_index_in_sync(self, test_db, user_shards):
+        """Test email changes and deletes are reflected in the index."""
+        from tests.test_db import TestAsyncSessionLocal
+
+        async with TestAsyncSessionLocal() as session:
+            async with user_shards.user_db(session) as user_db:
+                user = await user_db.create(
+                    {"email": "old@example.com", "hashed_password": "x"})
+                await user_db.update(user, {"email": "new@example.com"})
+
+                assert await user_db.get_by_email("old@example.com") is None
+                assert (await user_db.get_by_email("new@example.com")).id == user.id
+
+                await user_db.delete(user)
+                assert await user_db.get(user.id) is None
+                assert await session.scalar(
+                    select(func.count()).select_from(UserEmailShard)) == 0
+
+    async def test_failed_update_restores_index(self, test_db, user_shards, monkeypatch):
+        """Test the index is rolled back when the shard update fails."""
+        from fastapi_users.db import SQLAlchemyUserDatabase
+        from tests.test_db import TestAsyncSessionLocal
+
+        async with TestAsyncSessionLocal() as session:
+            async with user_shards.user_db(session) as user_db:
+                user = await user_db.create(
+                    {"email": "keep@example.com", "hashed_password": "x"})
+                await user_db.create(
+                    {"email": "taken@example.com", "hashed_password": "x"})
+
+                # The index rejects the new email: its session stays usable.
+                with pytest.raises(IntegrityError):
+                    await user_db.update(user, {"email": "taken@example.com"})
+                assert (await user_db.get_by_email("keep@example.com")).id == user.id
+
+                async def fail(self, user, update_dict):
+                    raise RuntimeError("shard down")
+
+                monkeypatch.setattr(SQLAlchemyUserDatabase, "update", fail)
+                with pytest.raises(RuntimeError):
+                    await user_db.update(user, {"email": "moved@example.com"})
+                assert (await user_db.get_by_email("keep@example.com")).id == user.id
+                assert await session.scalar(
+                    select(UserEmailShard.user_id)
+                    .where(UserEmailShard.email == "moved@example.com")) is None
+
+    async def test_stale_email_claim_is_reclaimed(self, client: AsyncClient, user_shards):
+        """Test an old index row without a shard user doesn't block the email."""
+        from datetime import datetime, timedelta, timezone
+        from tests.test_db import TestAsyncSessionLocal
+
+        async with TestAsyncSessionLocal() as session:
+            for email, age in (("stale@example.com", timedelta(hours=1)),
+                               ("fresh@example.com", timedelta(0))):
+                session.add(UserEmailShard(
+                    email=email, user_id=uuid.uuid4(), shard=0,
+                    claimed_at=datetime.now(timezone.utc) - age))
+            await session.commit()
+
+        user_data = {"email": "stale@example.com", "password": "testpassword123"}
+        response = await client.post("/auth/register", json=user_data)
+        assert response.status_code == 201
+
+        response = await client.post(
+            "/auth/jwt/login",
+            data={"username": user_data["email"], "password": user_data["password"]},
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        assert response.status_code == 200
+
+        # A recent claim may still be a registration in progress.
+        async with TestAsyncSessionLocal() as session:
+            async with user_shards.user_db(session) as user_db:
+                with pytest.raises(IntegrityError):
+                    await user_db.create(
+                        {"email": "fresh@example.com", "hashed_password": "x"})
+
+    async def test_rehash_is_conditional_on_shard(self, test_db, user_shards):
+        """Test the shard only takes a new hash over the one it replaces."""
+        from tests.test_db import TestAsyncSessionLocal
+
+        async with TestAsyncSessionLocal() as session:
+            async with user_shards.user_db(session) as user_db:
+                user = await user_db.create(
+                    {"email": "rehash@example.com", "hashed_password": "old"})
+                assert not await user_db.replace_hashed_password(user, "stale", "new")
+                assert (await user_db.get(user.id)).hashed_password == "old"
+                assert await user_db.replace_hashed_password(user, "old", "new")
+                await user_db.close()
+                assert (await user_db.get(user.id)).hashed_password == "new"